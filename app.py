@@ -1,7 +1,9 @@
 import os
+import time
+import uuid
 import typing as t
 import logging
-from flask import Flask, render_template, request, send_file
+from flask import Flask, g, redirect, render_template, request, send_file, url_for
 import utils
 
 # Set up logging
@@ -10,6 +12,111 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+PROFILED_ENDPOINTS = {'merge_pdf', 'split_pdf', 'compress_pdf', 'to_docx', 'from_docx'}
+
+
+def get_request_files() -> list:
+    """
+    Collects the files of an operation request: multipart `files` plus any
+    finalised chunked uploads referenced through `upload_ids`.
+    """
+    files = request.files.getlist('files')
+    g.opened_uploads = []
+    for upload_id in request.form.getlist('upload_ids'):
+        upload = utils.uploads.open_upload(upload_id)
+        g.opened_uploads.append(upload)
+        files.append(upload)
+    return files
+
+
+def persisted_result(stream, download_name: str, mimetype: str):
+    """
+    Stores an operation result on disk and points the client to its download
+    URL, which supports byte-range and conditional requests. Clients that
+    accept JSON get the URL in the body, so they can hand it to the browser
+    instead of downloading the result themselves; others are redirected.
+    """
+    result_id = utils.results.store_result(
+        stream=stream,
+        download_name=download_name,
+        mimetype=mimetype
+    )
+    logger.debug(f"Persisted result {result_id}")
+
+    result_url = url_for('result', result_id=result_id)
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return {'url': result_url, 'mimetype': mimetype}, 201, {'Location': result_url}
+    return redirect(result_url, code=303)
+
+
+def client_id() -> str:
+    remote_addr = request.remote_addr or 'unknown'
+    if utils.scheduler.TRUST_CLIENT_ID:
+        return request.headers.get('X-Client-ID', remote_addr)
+    return remote_addr
+
+
+@app.errorhandler(utils.scheduler.QueueFull)
+def queue_full(e):
+    logger.warning(f"Rejected request: {e}")
+    return str(e), 429, {'Retry-After': str(e.retry_after)}
+
+
+@app.after_request
+def add_server_timing(response):
+    timing = g.pop('timing', None)
+    if timing is not None:
+        response.headers['Server-Timing'] = timing.server_timing()
+        logger.debug(
+            f"{request.path}: queued {timing.queue_wait:.3f}s, executed {timing.execution:.3f}s")
+    return response
+
+
+def finish_profile():
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        # Profiling is optional and must never fail the request
+        try:
+            profiler.save()
+        except Exception as e:
+            logger.error(f"Failed to save profile {profiler.request_id}: {e}")
+            return None
+    return profiler
+
+
+@app.before_request
+def start_profile():
+    if request.method != 'POST' or request.endpoint not in PROFILED_ENDPOINTS:
+        return
+    token = request.headers.get('X-Pdeff-Profile', '')
+    if not utils.profiling.should_profile(token):
+        return
+
+    # Sampled clients must not pick IDs, or they could target other profiles
+    request_id = request.headers.get('X-Request-ID', '')
+    if not utils.profiling.is_admin(token) or not utils.profiling.is_valid_request_id(request_id):
+        request_id = uuid.uuid4().hex
+
+    g.profiler = utils.profiling.Profiler(request_id=request_id, name=request.path)
+    g.profiler.start()
+
+
+@app.after_request
+def attach_profile(response):
+    profiler = finish_profile()
+    if profiler is not None:
+        response.headers['X-Request-ID'] = profiler.request_id
+    return response
+
+
+@app.teardown_request
+def cleanup_request(exc):
+    # Requests that raised never reach after_request
+    finish_profile()
+    for upload in g.pop('opened_uploads', []):
+        upload.close()
+
 
 @app.route("/")
 def index():
@@ -25,11 +132,17 @@ def merge_pdf():
 
     elif request.method == 'POST':
         logger.debug("Processing merge PDF request")
-        files = request.files.getlist('files')
+        try:
+            files = get_request_files()
+        except utils.uploads.UploadError as e:
+            logger.error(f"Invalid upload reference: {e}")
+            return str(e), 400
         filename = request.form.get('filename', 'merged')
+        linearize = request.form.get('linearize', 'no') == 'yes'
 
         logger.debug(f"Received files: {len(files)}")
         logger.debug(f"Filename for the merged PDF: {filename}")
+        logger.debug(f"Linearize: {linearize}")
 
         final_name = utils.files.sanitize_filename(
             filename=filename,
@@ -37,12 +150,24 @@ def merge_pdf():
         )
         logger.debug(f"Sanitized filename: {final_name}")
 
-        try:
-            merged_pdf = utils.pdf.merge.merge_pdfs(files=files)
-            logger.debug(f"Merged {len(files)} PDF(s) successfully")
-        except Exception as e:
-            logger.error(f"Error merging PDFs: {e}")
-            return "Error merging PDFs", 500
+        # Linearising runs a full Ghostscript pass, which belongs in the heavy pool
+        with utils.scheduler.slot('heavy' if linearize else 'cheap', client_id()) as g.timing:
+            try:
+                merged_pdf = utils.pdf.merge.merge_pdfs(
+                    files=files,
+                    linearize=linearize
+                )
+                logger.debug(f"Merged {len(files)} PDF(s) successfully")
+            except Exception as e:
+                logger.error(f"Error merging PDFs: {e}")
+                return "Error merging PDFs", 500
+
+        if linearize:
+            return persisted_result(
+                merged_pdf,
+                download_name=final_name,
+                mimetype='application/pdf'
+            )
 
         return send_file(
             merged_pdf,
@@ -60,7 +185,11 @@ def split_pdf():
 
     elif request.method == 'POST':
         logger.debug("Processing split PDF request")
-        files = request.files.getlist('files')
+        try:
+            files = get_request_files()
+        except utils.uploads.UploadError as e:
+            logger.error(f"Invalid upload reference: {e}")
+            return str(e), 400
         stepping = int(request.form.get('stepping', 1))
 
         logger.debug(f"Received files: {len(files)}")
@@ -72,16 +201,17 @@ def split_pdf():
         )
         logger.debug(f"Sanitized filename: {final_name}")
 
-        try:
-            splitted_pdf = utils.pdf.split.split_pdf(
-                files=files,
-                stepping=stepping
-            )
-            logger.debug(
-                f"Successfully split the PDFs into {len(splitted_pdf)} parts")
-        except Exception as e:
-            logger.error(f"Error splitting PDFs: {e}")
-            return "Error splitting PDFs", 500
+        with utils.scheduler.slot('cheap', client_id()) as g.timing:
+            try:
+                splitted_pdf = utils.pdf.split.split_pdf(
+                    files=files,
+                    stepping=stepping
+                )
+                logger.debug(
+                    f"Successfully split the PDFs into {len(splitted_pdf)} parts")
+            except Exception as e:
+                logger.error(f"Error splitting PDFs: {e}")
+                return "Error splitting PDFs", 500
 
         return send_file(
             splitted_pdf,
@@ -99,27 +229,58 @@ def compress_pdf():
 
     elif request.method == 'POST':
         logger.debug("Processing compress PDF request")
-        files = request.files.getlist('files')
+        try:
+            files = get_request_files()
+        except utils.uploads.UploadError as e:
+            logger.error(f"Invalid upload reference: {e}")
+            return str(e), 400
         compression_level = request.form.get('compression_level', 'low')
+        linearize = request.form.get('linearize', 'no') == 'yes'
 
         logger.debug(f"Received files: {len(files)}")
         logger.debug(f"Compression level: {compression_level}")
+        logger.debug(f"Linearize: {linearize}")
 
-        final_name = utils.files.sanitize_filename(
-            filename=f"{len(files)}_compressed",
-            extension='.zip'
-        )
+        # A linearised PDF can only be viewed progressively outside a ZIP
+        single_pdf = linearize and len(files) == 1
+
+        if single_pdf:
+            final_name = utils.files.sanitize_filename(
+                filename=f"{files[0].filename.rsplit('.', 1)[0]}_{compression_level}_compressed",
+                extension='.pdf'
+            )
+        else:
+            final_name = utils.files.sanitize_filename(
+                filename=f"{len(files)}_compressed",
+                extension='.zip'
+            )
         logger.debug(f"Sanitized filename: {final_name}")
 
-        try:
-            compressed_pdf = utils.pdf.compress.compress_pdf(
-                files=files,
-                compression_level=compression_level,
+        with utils.scheduler.slot('heavy', client_id()) as g.timing:
+            try:
+                if single_pdf:
+                    compressed_pdf = utils.pdf.compress.compress_single_pdf(
+                        file=files[0],
+                        compression_level=compression_level,
+                        linearize=linearize,
+                    )
+                else:
+                    compressed_pdf = utils.pdf.compress.compress_pdf(
+                        files=files,
+                        compression_level=compression_level,
+                        linearize=linearize,
+                    )
+                logger.debug(f"Successfully compressed {len(files)} PDF(s)")
+            except Exception as e:
+                logger.error(f"Error compressing PDFs: {e}")
+                return "Error compressing PDFs", 500
+
+        if linearize:
+            return persisted_result(
+                compressed_pdf,
+                download_name=final_name,
+                mimetype='application/pdf' if single_pdf else 'application/zip'
             )
-            logger.debug(f"Successfully compressed {len(files)} PDF(s)")
-        except Exception as e:
-            logger.error(f"Error compressing PDFs: {e}")
-            return "Error compressing PDFs", 500
 
         return send_file(
             compressed_pdf,
@@ -137,7 +298,11 @@ def to_docx():
 
     elif request.method == 'POST':
         logger.debug("Processing to DOCX request")
-        files = request.files.getlist('files')
+        try:
+            files = get_request_files()
+        except utils.uploads.UploadError as e:
+            logger.error(f"Invalid upload reference: {e}")
+            return str(e), 400
         use_ocr = request.form.get('use_ocr', 'no')
 
         logger.debug(f"Received files: {len(files)}")
@@ -149,19 +314,20 @@ def to_docx():
         )
         logger.debug(f"Sanitized filename: {final_name}")
 
-        try:
-            if use_ocr == 'no':
-                converted_docx = utils.pdf.docx.to_docx_no_ocr(
-                    files=files,
-                )
-            else:
-                converted_docx = utils.pdf.docx.to_docx_ocr(
-                    files=files,
-                )
-            logger.debug(f"Successfully converted {len(files)} PDF(s)")
-        except Exception as e:
-            logger.error(f"Error converting PDFs: {e}")
-            return "Error converting PDFs", 500
+        with utils.scheduler.slot('heavy', client_id()) as g.timing:
+            try:
+                if use_ocr == 'no':
+                    converted_docx = utils.pdf.docx.to_docx_no_ocr(
+                        files=files,
+                    )
+                else:
+                    converted_docx = utils.pdf.docx.to_docx_ocr(
+                        files=files,
+                    )
+                logger.debug(f"Successfully converted {len(files)} PDF(s)")
+            except Exception as e:
+                logger.error(f"Error converting PDFs: {e}")
+                return "Error converting PDFs", 500
 
         return send_file(
             converted_docx,
@@ -178,7 +344,11 @@ def from_docx():
 
     elif request.method == 'POST':
         logger.debug("Processing compress PDF request")
-        files = request.files.getlist('files')
+        try:
+            files = get_request_files()
+        except utils.uploads.UploadError as e:
+            logger.error(f"Invalid upload reference: {e}")
+            return str(e), 400
 
         logger.debug(f"Received files: {len(files)}")
 
@@ -188,14 +358,15 @@ def from_docx():
         )
         logger.debug(f"Sanitized filename: {final_name}")
 
-        try:
-            compressed_pdf = utils.pdf.docx.to_pdf(
-                files=files,
-            )
-            logger.debug(f"Successfully compressed {len(files)} PDF(s)")
-        except Exception as e:
-            logger.error(f"Error compressing PDFs: {e}")
-            return "Error compressing PDFs", 500
+        with utils.scheduler.slot('heavy', client_id()) as g.timing:
+            try:
+                compressed_pdf = utils.pdf.docx.to_pdf(
+                    files=files,
+                )
+                logger.debug(f"Successfully compressed {len(files)} PDF(s)")
+            except Exception as e:
+                logger.error(f"Error compressing PDFs: {e}")
+                return "Error compressing PDFs", 500
 
         return send_file(
             compressed_pdf,
@@ -204,6 +375,132 @@ def from_docx():
             mimetype='application/zip'
         )
 
+
+@app.route("/results/<result_id>")
+def result(result_id):
+    try:
+        path, meta = utils.results.get_result(result_id)
+    except utils.results.ResultNotFound as e:
+        logger.error(f"Result not found: {e}")
+        return str(e), 404
+
+    # PDFs can be opened in the browser's viewer, which fetches page 1 first
+    inline = request.args.get('inline') == '1' and meta['mimetype'] == 'application/pdf'
+
+    # Served from disk, so Range, If-Range and If-None-Match are honoured
+    response = send_file(
+        path,
+        as_attachment=not inline,
+        download_name=meta['download_name'],
+        mimetype=meta['mimetype'],
+        conditional=True,
+        etag=True,
+        last_modified=meta['created'],
+        # Only cache for as long as the result is kept on the server
+        max_age=max(0, int(meta['created'] + utils.results.RESULT_TTL - time.time()))
+    )
+    # Results are users' documents, keep them out of shared caches
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+@app.route("/uploads", methods=['POST'])
+def create_upload():
+    logger.debug("Creating chunked upload")
+    try:
+        length = int(request.headers['Upload-Length'])
+        upload_id = utils.uploads.create_upload(
+            filename=request.args.get('filename', 'file'),
+            length=length
+        )
+    except (KeyError, ValueError) as e:
+        logger.error(f"Invalid upload creation request: {e}")
+        return "Upload-Length header must be a non-negative integer", 400
+    except utils.uploads.UploadTooLarge as e:
+        logger.error(f"Upload too large: {e}")
+        return str(e), 413
+
+    return {'upload_id': upload_id}, 201, {
+        'Location': f"/uploads/{upload_id}",
+        'Upload-Offset': '0',
+    }
+
+
+@app.route("/uploads/<upload_id>", methods=['HEAD', 'PATCH', 'DELETE'])
+def upload(upload_id):
+    try:
+        if request.method == 'HEAD':
+            meta = utils.uploads.get_upload(upload_id)
+            return "", 200, {
+                'Upload-Offset': str(meta['offset']),
+                'Upload-Length': str(meta['length']),
+                'Cache-Control': 'no-store',
+            }
+
+        elif request.method == 'PATCH':
+            try:
+                offset = int(request.headers['Upload-Offset'])
+            except (KeyError, ValueError):
+                return "Upload-Offset header must be an integer", 400
+
+            new_offset = utils.uploads.append_chunk(
+                upload_id=upload_id,
+                offset=offset,
+                stream=request.stream,
+                chunk_length=request.content_length
+            )
+            return "", 204, {'Upload-Offset': str(new_offset)}
+
+        elif request.method == 'DELETE':
+            utils.uploads.delete_upload(upload_id)
+            return "", 204
+
+    except utils.uploads.UploadNotFound as e:
+        logger.error(f"Upload not found: {e}")
+        return str(e), 404
+    except utils.uploads.UploadOffsetMismatch as e:
+        logger.error(f"Upload offset conflict: {e}")
+        return str(e), 409
+    except utils.uploads.UploadTooLarge as e:
+        logger.error(f"Upload chunk too large: {e}")
+        return str(e), 413
+
+
+@app.route("/uploads/<upload_id>/finalize", methods=['POST'])
+def finalize_upload(upload_id):
+    try:
+        meta = utils.uploads.finalize_upload(upload_id)
+    except utils.uploads.UploadNotFound as e:
+        logger.error(f"Upload not found: {e}")
+        return str(e), 404
+    except utils.uploads.UploadIncomplete as e:
+        logger.error(f"Upload incomplete: {e}")
+        return str(e), 409
+
+    return {'upload_id': upload_id, 'filename': meta['filename'], 'length': meta['length']}
+
+
+@app.route("/profiles/<request_id>", defaults={'kind': 'summary'})
+@app.route("/profiles/<request_id>/<kind>")
+def profile(request_id, kind):
+    if not utils.profiling.is_admin(request.headers.get('X-Pdeff-Profile', '')):
+        logger.error(f"Refused profile download for {request_id}")
+        return "Forbidden", 403
+
+    try:
+        path = utils.profiling.profile_path(request_id=request_id, kind=kind)
+    except FileNotFoundError as e:
+        logger.error(f"Profile not found: {e}")
+        return str(e), 404
+
+    return send_file(
+        path,
+        as_attachment=kind == 'speedscope',
+        mimetype='application/json'
+    )
+
+
 if __name__ == "__main__":
     logger.info("Starting the Flask app in debug mode")
     app.run("0.0.0.0", port=8080, debug=True)
@@ -0,0 +1,367 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import socket
+import tempfile
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from collections import Counter
+
+from PyPDF2 import PdfWriter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (path, form fields, number of PDFs attached)
+SCENARIOS = {
+    'merge_pdf': ('/merge_pdf', {'filename': 'loadtest_merged'}, 2),
+    'split_pdf': ('/split_pdf', {'stepping': '1'}, 1),
+    'compress_pdf': ('/compress_pdf', {'compression_level': 'medium'}, 1),
+    'to_docx': ('/to_docx', {'use_ocr': 'no'}, 1),
+    'to_docx_ocr': ('/to_docx', {'use_ocr': 'yes'}, 1),
+}
+DEFAULT_MIX = 'merge_pdf=4,split_pdf=3,compress_pdf=2,to_docx=1'
+
+
+def parse_mix(mix: str) -> list:
+    """
+    Parses 'name=weight,...' into a list of (scenario, weight).
+    """
+    parsed = []
+    for item in mix.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        parsed.append((name, float(weight or 1)))
+    return parsed
+
+
+def make_pdf(pages: int) -> bytes:
+    """
+    Builds a deterministic PDF with `pages` blank Letter pages.
+    """
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def encode_multipart(fields: dict, files: list) -> tuple:
+    """
+    Encodes form fields and (filename, content) pairs as multipart/form-data.
+
+    Returns:
+        tuple: The request body and its Content-Type header.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n'.encode())
+    for filename, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; '
+            f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'.encode())
+        parts.append(content)
+        parts.append(b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def build_requests(mix: list, pdfs: list) -> dict:
+    """
+    Pre-encodes one request body per scenario, so the client spends its time
+    waiting on the server rather than encoding.
+    """
+    requests_ = {}
+    for name, _ in mix:
+        path, fields, file_count = SCENARIOS[name]
+        files = [
+            (f"loadtest_{index}.pdf", pdfs[index % len(pdfs)])
+            for index in range(file_count)
+        ]
+        body, content_type = encode_multipart(fields, files)
+        requests_[name] = (path, body, content_type)
+    return requests_
+
+
+def read_rss(pid: int) -> int:
+    """
+    Returns the resident set size of `pid` in bytes, or 0 if unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def child_pids(pid: int) -> list:
+    """
+    Returns the PIDs of all descendants of `pid`, e.g. Ghostscript, Tesseract
+    and poppler processes started by the server.
+    """
+    descendants = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return descendants
+
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children", 'r') as f:
+                children = [int(child) for child in f.read().split()]
+        except (OSError, ValueError):
+            continue
+        for child in children:
+            descendants.append(child)
+            descendants.extend(child_pids(child))
+    return descendants
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, stub: bool, log_path: str) -> subprocess.Popen:
+    cmd = [sys.executable, '-m', 'loadtest.server', '--port', str(port)]
+    if stub:
+        cmd.append('--stub')
+
+    log_file = open(log_path, 'wb')
+    process = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=log_file, stderr=subprocess.STDOUT)
+    log_file.close()
+    return process
+
+
+def wait_until_ready(host: str, port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request('GET', '/')
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def run_level(host: str, port: int, concurrency: int, duration: float, mix: list,
+              requests_: dict, server_pid: int, timeout: float, seed: int) -> dict:
+    """
+    Runs `concurrency` closed-loop clients for `duration` seconds.
+
+    Returns:
+        dict: Latency percentiles, throughput, error rate and RSS of the level.
+    """
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    results = []  # (scenario, status, latency)
+    results_lock = threading.Lock()
+    rss_samples = []  # (server RSS, RSS of its child processes)
+    deadline = time.monotonic() + duration
+    done = threading.Event()
+
+    def client(index: int) -> None:
+        rng = random.Random(seed + index)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            path, body, content_type = requests_[name]
+            started = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection(host, port, timeout=timeout)
+                connection.request('POST', path, body=body, headers={
+                    'Content-Type': content_type,
+                    'X-Client-ID': f"loadtest-{index}",
+                })
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                connection.close()
+            except (OSError, http.client.HTTPException):
+                status = 0
+            with results_lock:
+                results.append((name, status, time.perf_counter() - started))
+
+    def sample_rss() -> None:
+        while not done.wait(0.25):
+            children_rss = sum(read_rss(child) for child in child_pids(server_pid))
+            rss_samples.append((read_rss(server_pid), children_rss))
+
+    sampler = None
+    if server_pid:
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+
+    started = time.monotonic()
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    done.set()
+    if sampler is not None:
+        sampler.join()
+
+    def summarize(entries: list) -> dict:
+        latencies = sorted(latency for _, _, latency in entries)
+        errors = sum(1 for _, status, _ in entries if not 200 <= status < 400)
+        return {
+            'requests': len(entries),
+            'throughput': len(entries) / elapsed if elapsed else 0.0,
+            'error_rate': errors / len(entries) if entries else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'statuses': dict(Counter(str(status) for _, status, _ in entries)),
+        }
+
+    level = summarize(results)
+    level['concurrency'] = concurrency
+    level['duration'] = elapsed
+    level['rss_peak'] = max((rss for rss, _ in rss_samples), default=0)
+    level['rss_end'] = rss_samples[-1][0] if rss_samples else 0
+    level['children_rss_peak'] = max((children for _, children in rss_samples), default=0)
+    level['total_rss_peak'] = max((rss + children for rss, children in rss_samples), default=0)
+    level['scenarios'] = {
+        name: summarize([entry for entry in results if entry[0] == name])
+        for name in names
+    }
+    return level
+
+
+def print_level(level: dict) -> None:
+    mb = 1024 * 1024
+    rss = (f"{level['rss_peak'] / mb:.0f} MB peak, {level['rss_end'] / mb:.0f} MB end, "
+           f"children {level['children_rss_peak'] / mb:.0f} MB peak, "
+           f"total {level['total_rss_peak'] / mb:.0f} MB peak"
+           if level['rss_peak'] else "n/a")
+    print(f"\nconcurrency {level['concurrency']}: {level['requests']} requests "
+          f"in {level['duration']:.1f}s, server RSS {rss}")
+    print(f"  {'scenario':<14} {'req':>6} {'req/s':>8} {'err%':>6} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+
+    rows = list(level['scenarios'].items()) + [('total', level)]
+    for name, stats in rows:
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(stats['statuses'].items()))
+        print(f"  {name:<14} {stats['requests']:>6} {stats['throughput']:>8.2f} "
+              f"{stats['error_rate'] * 100:>6.1f} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}  {statuses}")
+
+    # Without PDEFF_TRUST_CLIENT_ID=1 the server sees every simulated client
+    # as one remote address and rejects most requests with its per-client limit
+    if level['statuses'].get('429', 0) > level['requests'] / 2:
+        print("  warning: most requests were rejected with 429. If the server was "
+              "started separately, set PDEFF_TRUST_CLIENT_ID=1 for it so each "
+              "simulated client gets its own queue.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog='python -m loadtest',
+        description="Replay a mix of uploads against the PDeff app and report latency, "
+                    "throughput, error rate and server RSS.")
+    parser.add_argument('--url', help="Target a running server instead of starting one. "
+                                      "Start it with PDEFF_TRUST_CLIENT_ID=1")
+    parser.add_argument('--server-pid', type=int, default=0,
+                        help="PID of the server given with --url, to report its RSS")
+    parser.add_argument('--stub', action='store_true',
+                        help="Start the server with stand-ins for Ghostscript, Tesseract, poppler and Word")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Weighted scenarios, from {', '.join(SCENARIOS)} (default: {DEFAULT_MIX})")
+    parser.add_argument('--concurrency', default='1,4,16',
+                        help="Comma separated concurrency levels (default: 1,4,16)")
+    parser.add_argument('--duration', type=float, default=30,
+                        help="Seconds per concurrency level (default: 30)")
+    parser.add_argument('--pdf', action='append', default=[],
+                        help="PDF to upload, repeatable (default: generated blank PDFs)")
+    parser.add_argument('--pages', type=int, default=10,
+                        help="Pages of the generated PDFs (default: 10)")
+    parser.add_argument('--timeout', type=float, default=300,
+                        help="Per request timeout in seconds (default: 300)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.pdf:
+        pdfs = []
+        for path in args.pdf:
+            with open(path, 'rb') as f:
+                pdfs.append(f.read())
+    else:
+        pdfs = [make_pdf(args.pages)]
+    requests_ = build_requests(args.mix, pdfs)
+
+    process = None
+    if args.url:
+        target = urllib.parse.urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        server_pid = args.server_pid
+    else:
+        host, port = '127.0.0.1', free_port()
+        log_path = os.path.join(tempfile.gettempdir(), 'pdeff_loadtest_server.log')
+        process = start_server(port, args.stub, log_path)
+        server_pid = process.pid
+        print(f"Started server on port {port} (pid {server_pid}, log {log_path})")
+
+    levels = []
+    try:
+        wait_until_ready(host, port, process, timeout=60)
+        for concurrency in (int(c) for c in args.concurrency.split(',')):
+            level = run_level(
+                host=host,
+                port=port,
+                concurrency=concurrency,
+                duration=args.duration,
+                mix=args.mix,
+                requests_=requests_,
+                server_pid=server_pid,
+                timeout=args.timeout,
+                seed=args.seed,
+            )
+            print_level(level)
+            levels.append(level)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'stub': args.stub, 'mix': args.mix, 'levels': levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
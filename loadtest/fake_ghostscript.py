@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# Deterministic Ghostscript stand-in for the load test stub mode: accepts the
+# command line of the `gs` calls in utils.pdf and copies the input unchanged.
+import sys
+import shutil
+
+
+def main(argv: list) -> int:
+    output_path = None
+    input_paths = []
+
+    for arg in argv:
+        if arg.startswith('-sOutputFile='):
+            output_path = arg.split('=', 1)[1]
+        elif not arg.startswith('-'):
+            input_paths.append(arg)
+
+    if output_path is None or len(input_paths) != 1:
+        print("usage: fake_ghostscript.py [options] -sOutputFile=OUT IN", file=sys.stderr)
+        return 1
+
+    shutil.copyfile(input_paths[0], output_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,39 @@
+import os
+import sys
+import argparse
+import logging
+
+# Let `python loadtest/server.py` import `app` and `utils` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the PDeff app for load testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--stub', action='store_true',
+                        help="Replace Ghostscript, Tesseract, poppler and Word with local stand-ins")
+    parser.add_argument('--log-level', default='WARNING',
+                        help="Log level of the app while under load (default: WARNING)")
+    args = parser.parse_args()
+
+    # The harness sends one X-Client-ID per simulated client
+    os.environ.setdefault('PDEFF_TRUST_CLIENT_ID', '1')
+
+    if args.stub:
+        from loadtest import stubs
+        stubs.install()
+
+    from app import app
+
+    # The app configures DEBUG logging on import, which would dominate the
+    # request path under load
+    logging.getLogger().setLevel(args.log_level)
+    for name in list(logging.root.manager.loggerDict):
+        logging.getLogger(name).setLevel(args.log_level)
+
+    app.run(args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
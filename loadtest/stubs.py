@@ -0,0 +1,114 @@
+import os
+import sys
+import types
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+FAKE_GHOSTSCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ghostscript.py')
+FAKE_OCR_TEXT = "PDeff load test OCR text."
+
+# A one page, blank A4 PDF written by the fake Word application
+BLANK_PDF = (
+    b"%PDF-1.4\n"
+    b"1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    b"xref\n0 4\n"
+    b"0000000000 65535 f \n"
+    b"0000000009 00000 n \n"
+    b"0000000052 00000 n \n"
+    b"0000000101 00000 n \n"
+    b"trailer<</Size 4/Root 1 0 R>>\n"
+    b"startxref\n164\n%%EOF\n"
+)
+
+
+def _fake_image_to_string(image, *args, **kwargs) -> str:
+    return FAKE_OCR_TEXT
+
+
+def _fake_convert_from_path(pdf_path, dpi=200, **kwargs) -> list:
+    # Rasterising is done by poppler, only the page geometry is kept
+    from PIL import Image
+    from PyPDF2 import PdfReader
+
+    images = []
+    for page in PdfReader(pdf_path).pages:
+        width = int(float(page.mediabox.width) * dpi / 72)
+        height = int(float(page.mediabox.height) * dpi / 72)
+        images.append(Image.new('RGB', (width, height), 'white'))
+    return images
+
+
+class _FakeWordDocument:
+    def SaveAs(self, path, FileFormat=None):
+        with open(path, 'wb') as f:
+            f.write(BLANK_PDF)
+
+    def Close(self, save_changes=False):
+        pass
+
+
+class _FakeWordDocuments:
+    def Open(self, path):
+        return _FakeWordDocument()
+
+
+class _FakeWordApplication:
+    Visible = True
+
+    def __init__(self):
+        self.Documents = _FakeWordDocuments()
+
+    def Quit(self):
+        pass
+
+
+def _fake_dispatch(prog_id):
+    if prog_id != "Word.Application":
+        raise ValueError(f"Unsupported COM object: {prog_id}")
+    return _FakeWordApplication()
+
+
+def install() -> None:
+    """
+    Swaps the external converters for deterministic local stand-ins, so the
+    request path can be measured on any Linux box:
+
+    - Ghostscript is replaced by `fake_ghostscript.py`, which copies its input.
+    - Tesseract returns `FAKE_OCR_TEXT` for every page.
+    - poppler (pdf2image) returns blank images with the size of each page.
+    - Microsoft Word (pywin32) writes `BLANK_PDF` for every document.
+
+    Must be called before `app` or `utils` are imported.
+    """
+    if 'utils' in sys.modules:
+        raise RuntimeError("Stubs must be installed before utils is imported")
+
+    os.environ['PDEFF_GHOSTSCRIPT'] = FAKE_GHOSTSCRIPT
+
+    pytesseract = types.ModuleType('pytesseract')
+    pytesseract.image_to_string = _fake_image_to_string
+
+    pdf2image = types.ModuleType('pdf2image')
+    pdf2image.convert_from_path = _fake_convert_from_path
+
+    win32com = types.ModuleType('win32com')
+    win32com_client = types.ModuleType('win32com.client')
+    win32com_client.Dispatch = _fake_dispatch
+    win32com.client = win32com_client
+
+    pythoncom = types.ModuleType('pythoncom')
+    pythoncom.CoInitialize = lambda: None
+    pythoncom.CoUninitialize = lambda: None
+
+    sys.modules.update({
+        'pytesseract': pytesseract,
+        'pdf2image': pdf2image,
+        'win32com': win32com,
+        'win32com.client': win32com_client,
+        'pythoncom': pythoncom,
+    })
+    logger.info("Installed stub converters for Ghostscript, Tesseract, poppler and Word")
@@ -1 +1 @@
-from . import files, initialize, pdf
+from . import files, initialize, pdf, profiling, results, scheduler, uploads
@@ -1 +1 @@
-from . import merge, split, compress, docx, jpeg
+from . import merge, split, compress, docx, jpeg, linearize
@@ -6,11 +6,84 @@ import tempfile
 import subprocess
 import logging
 
+from .. import profiling
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+GHOSTSCRIPT = os.environ.get('PDEFF_GHOSTSCRIPT', 'gswin64')  # Or 'gs' on Linux/macOS
+
+LEVEL_TO_GS = {
+    'low': '/screen',
+    'medium': '/ebook',
+    'high': '/prepress'
+}
 
-def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'high']) -> io.BytesIO:
+
+def _ghostscript_command(input_path: str, output_path: str, compression_level: str, linearize: bool) -> list:
+    gs_quality = LEVEL_TO_GS.get(compression_level, '/ebook')
+    logger.debug(f"Ghostscript quality set to: {gs_quality}")
+
+    # Ghostscript command with better compression control
+    cmd = [
+        GHOSTSCRIPT,
+        '-sDEVICE=pdfwrite',
+        '-dCompatibilityLevel=1.4',
+        f'-dPDFSETTINGS={gs_quality}',
+        '-dDownsampleColorImages=true',
+        '-dColorImageResolution=100' if compression_level == 'medium' else '-dColorImageResolution=72',
+        '-dGrayImageResolution=100' if compression_level == 'medium' else '-dGrayImageResolution=72',
+        '-dMonoImageResolution=150',
+        '-dNOPAUSE',
+        '-dQUIET',
+        '-dBATCH',
+        f'-sOutputFile={output_path}',
+        input_path
+    ]
+    if linearize:
+        cmd.insert(-2, '-dFastWebView=true')
+    return cmd
+
+
+def compress_single_pdf(file, compression_level: t.Literal['low', 'medium', 'high'], linearize: bool = False) -> io.BytesIO:
+    """
+    Compresses a single PDF file using Ghostscript and returns the compressed
+    PDF itself, so a linearised result can be viewed progressively.
+
+    Args:
+        file: A file-like object representing the PDF file to be compressed.
+        compression_level (Literal['low', 'medium', 'high']): The level of compression to apply,
+            where 'low' provides the highest quality and 'high' provides the smallest file size.
+        linearize (bool): Whether to linearise the compressed PDF (fast web view).
+
+    Returns:
+        io.BytesIO: A BytesIO stream containing the compressed PDF.
+
+    Raises:
+        subprocess.CalledProcessError: If Ghostscript fails.
+    """
+    logger.debug(f"Compressing {file.filename} with level: {compression_level}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        original_path = os.path.join(tmpdir, "original.pdf")
+        compressed_path = os.path.join(tmpdir, "compressed.pdf")
+
+        file.seek(0)
+        with open(original_path, 'wb') as f:
+            f.write(file.read())
+
+        cmd = _ghostscript_command(original_path, compressed_path, compression_level, linearize)
+        with profiling.stage('ghostscript'):
+            subprocess.run(cmd, check=True)
+
+        with open(compressed_path, 'rb') as f:
+            output = io.BytesIO(f.read())
+
+    logger.debug(f"Compression of {file.filename} completed successfully.")
+    return output
+
+
+def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'high'], linearize: bool = False) -> io.BytesIO:
     """
     Compresses a list of PDF files using Ghostscript and returns a zip archive
     of the compressed PDFs.
@@ -19,6 +92,8 @@ def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'hig
         files (list): A list of file-like objects representing the PDF files to be compressed.
         compression_level (Literal['low', 'medium', 'high']): The level of compression to apply,
             where 'low' provides the highest quality and 'high' provides the smallest file size.
+        linearize (bool): Whether to linearise the compressed PDFs (fast web view), so viewers
+            can show the first page before the whole file is downloaded.
 
     Returns:
         io.BytesIO: A BytesIO stream containing a zip archive of the compressed PDF files.
@@ -31,15 +106,6 @@ def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'hig
 
     zip_buffer = io.BytesIO()
 
-    level_to_gs = {
-        'low': '/screen',
-        'medium': '/ebook',
-        'high': '/prepress'
-    }
-
-    gs_quality = level_to_gs.get(compression_level, '/ebook')
-    logger.debug(f"Ghostscript quality set to: {gs_quality}")
-
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file, tempfile.TemporaryDirectory() as tmpdir:
         for index, file in enumerate(files):
             logger.debug(
@@ -60,27 +126,13 @@ def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'hig
                     f"Error writing file {file.filename} to disk: {e}")
                 continue
 
-            # Ghostscript command with better compression control
-            cmd = [
-                'gswin64',  # Or 'gs' on Linux/macOS
-                '-sDEVICE=pdfwrite',
-                '-dCompatibilityLevel=1.4',
-                f'-dPDFSETTINGS={gs_quality}',
-                '-dDownsampleColorImages=true',
-                '-dColorImageResolution=100' if compression_level == 'medium' else '-dColorImageResolution=72',
-                '-dGrayImageResolution=100' if compression_level == 'medium' else '-dGrayImageResolution=72',
-                '-dMonoImageResolution=150',
-                '-dNOPAUSE',
-                '-dQUIET',
-                '-dBATCH',
-                f'-sOutputFile={compressed_path}',
-                original_path
-            ]
+            cmd = _ghostscript_command(original_path, compressed_path, compression_level, linearize)
 
             try:
                 logger.debug(
                     f"Running Ghostscript command for {file.filename}")
-                subprocess.run(cmd, check=True)
+                with profiling.stage('ghostscript'):
+                    subprocess.run(cmd, check=True)
                 logger.debug(
                     f"Compression of {file.filename} completed successfully.")
             except subprocess.CalledProcessError as e:
@@ -102,7 +154,8 @@ def compress_pdf(files: list, compression_level: t.Literal['low', 'medium', 'hig
                 file, 'filename', f'file_{index}').rsplit('.', 1)[0]
             zip_name = f"{base_name}_{compression_level}_compressed.pdf"
             try:
-                zip_file.writestr(zip_name, content)
+                with profiling.stage('zip_write'):
+                    zip_file.writestr(zip_name, content)
                 logger.debug(
                     f"File {file.filename} added to zip as {zip_name}")
             except Exception as e:
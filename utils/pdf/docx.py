@@ -15,6 +15,8 @@ import fitz  # PyMuPDF
 import win32com.client
 import pythoncom 
 
+from .. import profiling
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -50,9 +52,10 @@ def to_docx_no_ocr(files: list) -> io.BytesIO:
                     raw_docx_path = os.path.join(tmpdir, f"raw_{docx_filename}")
                     final_docx_path = os.path.join(tmpdir, docx_filename)
 
-                    cv = Converter(file_path)
-                    cv.convert(raw_docx_path, start=0, end=None)
-                    cv.close()
+                    with profiling.stage('pdf2docx'):
+                        cv = Converter(file_path)
+                        cv.convert(raw_docx_path, start=0, end=None)
+                        cv.close()
                     logger.debug(f"Converted to DOCX: {raw_docx_path}")
 
                     pdf_doc = fitz.open(file_path)
@@ -73,7 +76,7 @@ def to_docx_no_ocr(files: list) -> io.BytesIO:
                     doc.save(final_docx_path)
 
                     # Step 3: Add to ZIP
-                    with open(final_docx_path, 'rb') as docx_file:
+                    with open(final_docx_path, 'rb') as docx_file, profiling.stage('zip_write'):
                         zip_file.writestr(docx_filename, docx_file.read())
                         logger.debug(f"Added {docx_filename} to ZIP")
 
@@ -104,7 +107,8 @@ def to_docx_ocr(files: list) -> io.BytesIO:
                         f.write(file.read())
 
                     # Convert PDF to images
-                    images = convert_from_path(pdf_path, dpi=300)
+                    with profiling.stage('pdftoppm'):
+                        images = convert_from_path(pdf_path, dpi=300)
                     logger.debug(f"Converted {len(images)} pages to images")
 
                     doc = Document()
@@ -120,7 +124,8 @@ def to_docx_ocr(files: list) -> io.BytesIO:
                         section.page_height = pixels_to_docx_units(height)
 
                         # OCR text
-                        text = pytesseract.image_to_string(image)
+                        with profiling.stage('tesseract'):
+                            text = pytesseract.image_to_string(image)
                         doc.add_paragraph(text)
 
                         logger.debug(f"OCR done for page {i + 1}, size {width}x{height}px")
@@ -131,7 +136,7 @@ def to_docx_ocr(files: list) -> io.BytesIO:
                     doc.save(docx_path)
 
                     # Add to zip
-                    with open(docx_path, 'rb') as f:
+                    with open(docx_path, 'rb') as f, profiling.stage('zip_write'):
                         zip_file.writestr(docx_filename, f.read())
                         logger.debug(f"Added {docx_filename} to zip")
 
@@ -165,14 +170,15 @@ def to_pdf(files: list) -> io.BytesIO:
 
                     pythoncom.CoInitialize()
                     try:
-                        word = win32com.client.Dispatch("Word.Application")
-                        word.Visible = False
-                        wdFormatPDF = 17
-
-                        doc = word.Documents.Open(str(input_path))
-                        doc.SaveAs(str(output_path), FileFormat=wdFormatPDF)
-                        doc.Close(False)
-                        word.Quit()
+                        with profiling.stage('word'):
+                            word = win32com.client.Dispatch("Word.Application")
+                            word.Visible = False
+                            wdFormatPDF = 17
+
+                            doc = word.Documents.Open(str(input_path))
+                            doc.SaveAs(str(output_path), FileFormat=wdFormatPDF)
+                            doc.Close(False)
+                            word.Quit()
                         logger.debug(f"Converted to PDF: {output_path}")
                     finally:
                         pythoncom.CoUninitialize()
@@ -180,7 +186,7 @@ def to_pdf(files: list) -> io.BytesIO:
                     if not os.path.exists(output_path):
                         raise FileNotFoundError(f"PDF not created for {filename}")
 
-                    with open(output_path, 'rb') as pdf_file:
+                    with open(output_path, 'rb') as pdf_file, profiling.stage('zip_write'):
                         zip_file.writestr(base_name + ".pdf", pdf_file.read())
                         logger.debug(f"Added {base_name}.pdf to ZIP")
 
@@ -0,0 +1,68 @@
+import io
+import os
+import tempfile
+import subprocess
+import logging
+
+from .. import profiling
+from .compress import GHOSTSCRIPT
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def linearize_pdf(pdf: io.BytesIO) -> io.BytesIO:
+    """
+    Linearises a PDF (fast web view) using Ghostscript, so viewers can show
+    the first page before the whole file is downloaded.
+
+    Images are kept at their resolution and are not re-compressed lossily:
+    JPEGs are passed through and other images are Flate encoded.
+
+    Args:
+        pdf (io.BytesIO): A stream containing the PDF to linearise.
+
+    Returns:
+        io.BytesIO: A BytesIO stream containing the linearised PDF.
+
+    Raises:
+        subprocess.CalledProcessError: If Ghostscript fails.
+    """
+    logger.debug("Linearising PDF with Ghostscript")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = os.path.join(tmpdir, "input.pdf")
+        output_path = os.path.join(tmpdir, "linearized.pdf")
+
+        pdf.seek(0)
+        with open(input_path, 'wb') as f:
+            f.write(pdf.read())
+
+        cmd = [
+            GHOSTSCRIPT,
+            '-sDEVICE=pdfwrite',
+            '-dFastWebView=true',
+            # Rewriting must not degrade the already merged document
+            '-dPassThroughJPEGImages=true',
+            '-dAutoFilterColorImages=false',
+            '-dAutoFilterGrayImages=false',
+            '-dColorImageFilter=/FlateEncode',
+            '-dGrayImageFilter=/FlateEncode',
+            '-dDownsampleColorImages=false',
+            '-dDownsampleGrayImages=false',
+            '-dDownsampleMonoImages=false',
+            '-dNOPAUSE',
+            '-dQUIET',
+            '-dBATCH',
+            f'-sOutputFile={output_path}',
+            input_path
+        ]
+
+        with profiling.stage('ghostscript'):
+            subprocess.run(cmd, check=True)
+
+        with open(output_path, 'rb') as f:
+            output = io.BytesIO(f.read())
+
+    logger.debug("PDF linearised successfully.")
+    return output
@@ -2,16 +2,20 @@ import io
 import logging
 from PyPDF2 import PdfMerger
 
+from .. import profiling
+from .linearize import linearize_pdf
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-def merge_pdfs(files: list) -> io.BytesIO:
+def merge_pdfs(files: list, linearize: bool = False) -> io.BytesIO:
     """
     Merges a list of PDF file paths or file-like objects into a single PDF stream.
 
     Args:
         files (list): A list of file paths or file-like objects to PDF files.
+        linearize (bool): Whether to linearise the merged PDF (fast web view) with Ghostscript.
 
     Returns:
         io.BytesIO: A BytesIO stream containing the merged PDF.
@@ -34,7 +38,8 @@ def merge_pdfs(files: list) -> io.BytesIO:
         for index, f in enumerate(files):
             logger.debug(f"Appending file {index + 1}/{len(files)}: {f}")
             try:
-                merger.append(f)
+                with profiling.stage('pypdf2_parse'):
+                    merger.append(f)
                 logger.debug(f"Successfully appended file {f}")
             except Exception as e:
                 logger.error(f"Error appending file '{f}' to merger: {e}")
@@ -43,13 +48,21 @@ def merge_pdfs(files: list) -> io.BytesIO:
 
         try:
             logger.debug("Writing merged PDF to output stream.")
-            merger.write(output)
+            with profiling.stage('pypdf2_write'):
+                merger.write(output)
             logger.debug("Merged PDF written successfully.")
         except Exception as e:
             logger.error(f"Failed to write merged PDF to output stream: {e}")
             raise Exception(
                 "Failed to write merged PDF to output stream.") from e
 
+        if linearize:
+            try:
+                output = linearize_pdf(output)
+            except Exception as e:
+                logger.error(f"Failed to linearise merged PDF: {e}")
+                raise Exception("Failed to linearise merged PDF.") from e
+
         output.seek(0)
         logger.debug("PDF merge complete, returning merged PDF stream.")
         return output
@@ -3,6 +3,8 @@ import zipfile
 import logging
 from PyPDF2 import PdfReader, PdfWriter
 
+from .. import profiling
+
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,8 @@ def split_pdf(files: list, stepping: int) -> io.BytesIO:
             file.seek(0)
 
             try:
-                reader = PdfReader(file)
+                with profiling.stage('pypdf2_parse'):
+                    reader = PdfReader(file)
                 logger.debug(f"Successfully read PDF {file.filename}.")
             except Exception as e:
                 logger.error(f"Error reading PDF {file.filename}: {e}")
@@ -44,20 +47,22 @@ def split_pdf(files: list, stepping: int) -> io.BytesIO:
                 file, 'filename', f'file_{index}').rsplit('.', 1)[0]
 
             for i in range(0, total_pages, stepping):
-                writer = PdfWriter()
+                with profiling.stage('pypdf2_write'):
+                    writer = PdfWriter()
 
-                for j in range(i, min(i + stepping, total_pages)):
-                    writer.add_page(reader.pages[j])
+                    for j in range(i, min(i + stepping, total_pages)):
+                        writer.add_page(reader.pages[j])
 
-                output_pdf = io.BytesIO()
-                writer.write(output_pdf)
-                output_pdf.seek(0)
+                    output_pdf = io.BytesIO()
+                    writer.write(output_pdf)
+                    output_pdf.seek(0)
 
                 part_name = f"{base_name}_p{i+1}_to_p{min(i+stepping, total_pages)}.pdf"
 
                 # Add to zip
                 try:
-                    zip_file.writestr(part_name, output_pdf.read())
+                    with profiling.stage('zip_write'):
+                        zip_file.writestr(part_name, output_pdf.read())
                     logger.debug(f"Added part {part_name} to ZIP.")
                 except Exception as e:
                     logger.error(f"Failed to add {part_name} to ZIP: {e}")
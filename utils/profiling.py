@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import logging
+import tempfile
+import threading
+import contextlib
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get(
+    'PDEFF_PROFILE_DIR',
+    os.path.join(tempfile.gettempdir(), 'pdeff_profiles')
+)
+PROFILE_TOKEN = os.environ.get('PDEFF_PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PDEFF_PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(os.environ.get('PDEFF_PROFILE_INTERVAL', 0.005))
+PROFILE_TTL = 7 * 24 * 60 * 60  # seconds a stored profile is kept
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_local = threading.local()
+
+
+def is_admin(token: str) -> bool:
+    """
+    Checks a profiling header value against the admin token. Always False
+    when no token is configured.
+
+    Args:
+        token (str): Value of the profiling header, empty if absent.
+    """
+    if not PROFILE_TOKEN:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def should_profile(token: str) -> bool:
+    """
+    Decides whether a request is profiled: either it carries the admin
+    profiling token, or it is picked by the configured sample rate.
+
+    Args:
+        token (str): Value of the profiling header, empty if absent.
+    """
+    if is_admin(token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def is_valid_request_id(request_id: str) -> bool:
+    return bool(request_id) and bool(_REQUEST_ID_RE.match(request_id))
+
+
+class Profiler:
+    """
+    Samples the Python stack of one thread at a fixed interval and records
+    the wall time of named stages (see `stage`).
+
+    Args:
+        request_id (str): ID the profile is stored and retrieved under.
+        name (str): Human readable description, e.g. the request path.
+        interval (float): Seconds between two stack samples.
+    """
+
+    def __init__(self, request_id: str, name: str, interval: float = PROFILE_INTERVAL):
+        self.request_id = request_id
+        self.name = name
+        self.interval = interval
+
+        self.stages = []
+        self._stack_samples = []  # (stack of frame keys, weight)
+        self._thread_id = None
+        self._sampler = None
+        self._stop_event = threading.Event()
+        self._start = 0.0
+        self._end = 0.0
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+        _local.profiler = self
+
+        self._sampler = threading.Thread(
+            target=self._sample, name=f"profiler-{self.request_id}", daemon=True)
+        self._sampler.start()
+        logger.debug(f"Started profiling request {self.request_id}")
+
+    def stop(self) -> None:
+        self._end = time.perf_counter()
+        self._stop_event.set()
+        self._sampler.join()
+        if getattr(_local, 'profiler', None) is self:
+            del _local.profiler
+        logger.debug(
+            f"Stopped profiling request {self.request_id} "
+            f"({len(self._stack_samples)} samples)")
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+
+            if stack:
+                self._stack_samples.append((stack, now - last))
+            last = now
+
+    def record_stage(self, name: str, start: float, end: float) -> None:
+        self.stages.append({
+            'name': name,
+            'start': start - self._start,
+            'duration': end - start,
+        })
+
+    def summary(self) -> dict:
+        """
+        Returns the total wall time per stage next to the request duration.
+        """
+        totals = {}
+        for stage_ in self.stages:
+            entry = totals.setdefault(stage_['name'], {'count': 0, 'duration': 0.0})
+            entry['count'] += 1
+            entry['duration'] += stage_['duration']
+
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'duration': self._end - self._start,
+            'samples': len(self._stack_samples),
+            'stage_totals': totals,
+            'stages': self.stages,
+        }
+
+    def speedscope(self) -> dict:
+        """
+        Returns the profile in the speedscope file format: a sampled profile
+        of the Python stacks and an evented profile of the stages.
+        """
+        frames = []
+        frame_index = {}
+
+        def index_of(key):
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                name, file, line = key
+                frames.append({'name': name, 'file': file, 'line': line})
+            return frame_index[key]
+
+        samples = [[index_of(key) for key in stack] for stack, _ in self._stack_samples]
+        weights = [weight for _, weight in self._stack_samples]
+
+        keyed_events = []
+        for stage_ in self.stages:
+            frame = index_of((f"[stage] {stage_['name']}", '', 0))
+            start, duration = stage_['start'], stage_['duration']
+            if duration <= 0:
+                continue
+            # On equal timestamps closes go first, outer stages open first
+            # and inner stages close first, so the events stay well nested
+            keyed_events.append(((start, 1, start, -duration),
+                                 {'type': 'O', 'at': start, 'frame': frame}))
+            keyed_events.append(((start + duration, 0, -start, duration),
+                                 {'type': 'C', 'at': start + duration, 'frame': frame}))
+        events = [event for _, event in sorted(keyed_events, key=lambda e: e[0])]
+
+        duration = self._end - self._start
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f"{self.name} ({self.request_id})",
+            'exporter': 'pdeff',
+            'shared': {'frames': frames},
+            'profiles': [
+                {
+                    'type': 'sampled',
+                    'name': 'Python stacks',
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': sum(weights),
+                    'samples': samples,
+                    'weights': weights,
+                },
+                {
+                    'type': 'evented',
+                    'name': 'Stages',
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': duration,
+                    'events': events,
+                },
+            ],
+        }
+
+    def save(self) -> None:
+        """
+        Writes the stage summary and the speedscope profile to `PROFILE_DIR`.
+
+        An existing profile is never overwritten: if the request ID is taken,
+        the profile is stored under a fresh `request_id` instead.
+        """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        purge_expired()
+
+        while True:
+            try:
+                summary_file = open(
+                    os.path.join(PROFILE_DIR, f"{self.request_id}.json"), 'x', encoding='utf-8')
+                break
+            except FileExistsError:
+                logger.warning(f"Profile {self.request_id} already exists, using a new ID")
+                self.request_id = uuid.uuid4().hex
+
+        with summary_file:
+            json.dump(self.summary(), summary_file)
+        with open(os.path.join(PROFILE_DIR, f"{self.request_id}.speedscope.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.speedscope(), f)
+
+        logger.debug(f"Saved profile for request {self.request_id} to {PROFILE_DIR}")
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Records the wall time of a block as a named stage of the profile running
+    on the current thread. Does nothing when the request is not profiled.
+
+    Args:
+        name (str): Stage name, e.g. 'ghostscript' or 'zip_write'.
+    """
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.record_stage(name, start, time.perf_counter())
+
+
+def profile_path(request_id: str, kind: str) -> str:
+    """
+    Returns the path of a stored profile.
+
+    Args:
+        request_id (str): ID of the profiled request.
+        kind (str): 'summary' for the stage breakdown, 'speedscope' for the profile.
+
+    Raises:
+        FileNotFoundError: If the ID is invalid or no such profile was stored.
+    """
+    if not is_valid_request_id(request_id) or kind not in ('summary', 'speedscope'):
+        raise FileNotFoundError(f"No {kind} profile for request {request_id!r}")
+
+    suffix = '.json' if kind == 'summary' else '.speedscope.json'
+    path = os.path.join(PROFILE_DIR, request_id + suffix)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No {kind} profile for request {request_id!r}")
+    return path
+
+
+def purge_expired(ttl: int = PROFILE_TTL) -> None:
+    """
+    Removes profiles older than `ttl` seconds.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return
+
+    cutoff = time.time() - ttl
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                logger.debug(f"Purged expired profile {name}")
+        except OSError:
+            continue
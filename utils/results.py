@@ -0,0 +1,111 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+RESULT_DIR = os.environ.get(
+    'PDEFF_RESULT_DIR',
+    os.path.join(tempfile.gettempdir(), 'pdeff_results')
+)
+RESULT_TTL = 24 * 60 * 60  # seconds a result can be downloaded
+
+_RESULT_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ResultNotFound(Exception):
+    """Raised when a result ID is unknown, malformed or expired."""
+
+
+def _result_path(result_id: str) -> str:
+    # The ID ends up in a filesystem path, so only accept what we generate
+    if not isinstance(result_id, str) or not _RESULT_ID_RE.match(result_id):
+        raise ResultNotFound(f"Invalid result ID: {result_id!r}")
+    return os.path.join(RESULT_DIR, result_id)
+
+
+def store_result(stream, download_name: str, mimetype: str) -> str:
+    """
+    Persists the output of an operation so it can be downloaded with
+    byte-range and conditional requests.
+
+    Args:
+        stream: A readable binary stream with the result, e.g. an io.BytesIO.
+        download_name (str): Filename offered to the client.
+        mimetype (str): Content type of the result.
+
+    Returns:
+        str: The ID the result can be downloaded under.
+    """
+    purge_expired()
+
+    result_id = uuid.uuid4().hex
+    result_path = _result_path(result_id)
+    os.makedirs(result_path)
+
+    stream.seek(0)
+    with open(os.path.join(result_path, 'data'), 'wb') as f:
+        shutil.copyfileobj(stream, f)
+
+    with open(os.path.join(result_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'download_name': download_name,
+            'mimetype': mimetype,
+            'created': time.time(),
+        }, f)
+
+    logger.debug(f"Stored result {result_id} as {download_name}")
+    return result_id
+
+
+def get_result(result_id: str) -> tuple:
+    """
+    Looks up a stored result.
+
+    Args:
+        result_id (str): ID returned by `store_result`.
+
+    Returns:
+        tuple: Path of the result data and its metadata
+            (`download_name`, `mimetype`, `created`).
+
+    Raises:
+        ResultNotFound: If the result does not exist or has expired.
+    """
+    result_path = _result_path(result_id)
+    try:
+        with open(os.path.join(result_path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise ResultNotFound(f"Unknown result ID: {result_id}") from None
+
+    if meta['created'] < time.time() - RESULT_TTL:
+        raise ResultNotFound(f"Result {result_id} has expired")
+
+    return os.path.join(result_path, 'data'), meta
+
+
+def purge_expired(ttl: int = RESULT_TTL) -> None:
+    """
+    Removes results older than `ttl` seconds.
+    """
+    if not os.path.isdir(RESULT_DIR):
+        return
+
+    cutoff = time.time() - ttl
+    for result_id in os.listdir(RESULT_DIR):
+        meta_path = os.path.join(RESULT_DIR, result_id, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                created = json.load(f)['created']
+        except (OSError, ValueError, KeyError):
+            continue
+        if created < cutoff:
+            shutil.rmtree(os.path.join(RESULT_DIR, result_id), ignore_errors=True)
+            logger.debug(f"Purged expired result {result_id}")
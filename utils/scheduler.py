@@ -0,0 +1,195 @@
+import os
+import math
+import time
+import logging
+import threading
+import contextlib
+from collections import OrderedDict, deque
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Only honour X-Client-ID behind a trusted proxy (or in load tests), since any
+# client can send a fresh ID per request and dodge the per-client queue limit
+TRUST_CLIENT_ID = os.environ.get('PDEFF_TRUST_CLIENT_ID', '') == '1'
+
+
+class QueueFull(Exception):
+    """
+    Raised when a request cannot be admitted to a pool, either because its
+    queue is at capacity or because it waited longer than allowed.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Timing:
+    """Queue wait and execution time of a single scheduled request, in seconds."""
+
+    def __init__(self, pool: str):
+        self.pool = pool
+        self.queue_wait = 0.0
+        self.execution = 0.0
+
+    def server_timing(self) -> str:
+        return (f"queue;desc=\"{self.pool}\";dur={self.queue_wait * 1000:.1f}, "
+                f"exec;desc=\"{self.pool}\";dur={self.execution * 1000:.1f}")
+
+
+class _Ticket:
+    __slots__ = ('granted',)
+
+    def __init__(self):
+        self.granted = False
+
+
+class Pool:
+    """
+    A concurrency budget with per-client fair queuing.
+
+    At most `concurrency` requests run at once. Waiting requests are kept in
+    one FIFO per client and slots are handed out round-robin across clients,
+    so a client submitting many jobs cannot starve the others.
+
+    Args:
+        name (str): Name used in logs and timing headers.
+        concurrency (int): Number of requests allowed to run at the same time.
+        max_queue (int): Number of requests allowed to wait across all clients.
+        max_queue_per_client (int): Number of requests a single client may have waiting.
+        max_wait (float): Seconds a request may wait before it is rejected.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int,
+                 max_queue_per_client: int, max_wait: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queued = 0
+        self._queues = OrderedDict()  # client -> deque of tickets
+        self._avg_execution = 1.0
+
+    def _retry_after(self) -> int:
+        estimate = self._avg_execution * (self._queued / self.concurrency + 1)
+        return min(300, max(1, math.ceil(estimate)))
+
+    def _dispatch(self) -> None:
+        # Caller must hold self._cond
+        while self._running < self.concurrency and self._queues:
+            client, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+
+            # Move the client to the back of the rotation
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+
+            ticket.granted = True
+            self._running += 1
+            self._queued -= 1
+
+        self._cond.notify_all()
+
+    def _withdraw(self, client: str, ticket: _Ticket) -> None:
+        # Caller must hold self._cond
+        queue = self._queues.get(client)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self._queued -= 1
+            if not queue:
+                del self._queues[client]
+
+    @contextlib.contextmanager
+    def slot(self, client: str):
+        """
+        Waits for a free slot and holds it for the duration of the block.
+
+        Args:
+            client (str): Identifier of the client the request belongs to.
+
+        Yields:
+            Timing: Filled with the queue wait now and the execution time on exit.
+
+        Raises:
+            QueueFull: If the request is rejected or waited longer than `max_wait`.
+        """
+        timing = Timing(self.name)
+        ticket = _Ticket()
+        queued_at = time.monotonic()
+
+        with self._cond:
+            client_queue = self._queues.get(client, ())
+            if self._running >= self.concurrency:
+                if self._queued >= self.max_queue:
+                    raise QueueFull(f"{self.name} queue is full", self._retry_after())
+                if len(client_queue) >= self.max_queue_per_client:
+                    raise QueueFull(
+                        f"Too many queued {self.name} requests for {client}", self._retry_after())
+
+            self._queues.setdefault(client, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+
+            deadline = queued_at + self.max_wait
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(client, ticket)
+                    raise QueueFull(
+                        f"Timed out waiting for a {self.name} slot", self._retry_after())
+                self._cond.wait(remaining)
+
+        started_at = time.monotonic()
+        timing.queue_wait = started_at - queued_at
+        logger.debug(
+            f"Admitted {self.name} request from {client} after {timing.queue_wait:.3f}s")
+
+        try:
+            yield timing
+        finally:
+            timing.execution = time.monotonic() - started_at
+            with self._cond:
+                self._running -= 1
+                self._avg_execution = 0.8 * self._avg_execution + 0.2 * timing.execution
+                self._dispatch()
+            logger.debug(
+                f"Finished {self.name} request from {client} in {timing.execution:.3f}s")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+_cpus = os.cpu_count() or 1
+
+pools = {
+    # merge and split are cheap PyPDF2 page shuffling
+    'cheap': Pool(
+        name='cheap',
+        concurrency=_env_int('PDEFF_CHEAP_CONCURRENCY', _cpus),
+        max_queue=_env_int('PDEFF_CHEAP_MAX_QUEUE', 4 * _cpus),
+        max_queue_per_client=_env_int('PDEFF_CHEAP_MAX_QUEUE_PER_CLIENT', _cpus),
+        max_wait=_env_int('PDEFF_CHEAP_MAX_WAIT', 60),
+    ),
+    # Ghostscript, OCR and DOCX conversions are CPU and memory bound
+    'heavy': Pool(
+        name='heavy',
+        concurrency=_env_int('PDEFF_HEAVY_CONCURRENCY', max(1, _cpus // 2)),
+        max_queue=_env_int('PDEFF_HEAVY_MAX_QUEUE', _cpus),
+        max_queue_per_client=_env_int('PDEFF_HEAVY_MAX_QUEUE_PER_CLIENT', 2),
+        max_wait=_env_int('PDEFF_HEAVY_MAX_WAIT', 300),
+    ),
+}
+
+
+def slot(pool: str, client: str):
+    """
+    Shortcut for `pools[pool].slot(client)`.
+    """
+    return pools[pool].slot(client)
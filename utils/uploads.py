@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+
+from werkzeug.datastructures import FileStorage
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.environ.get(
+    'PDEFF_UPLOAD_DIR',
+    os.path.join(tempfile.gettempdir(), 'pdeff_uploads')
+)
+UPLOAD_TTL = 24 * 60 * 60  # seconds an upload is kept after its last activity
+UPLOAD_MAX_SIZE = int(os.environ.get('PDEFF_MAX_UPLOAD_SIZE', 2 * 1024 ** 3))
+CHUNK_BUFFER_SIZE = 1024 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_locks: dict = {}
+_locks_guard = threading.Lock()
+
+
+class UploadError(Exception):
+    """Base class for chunked upload errors."""
+
+
+class UploadNotFound(UploadError):
+    """Raised when an upload ID is unknown or malformed."""
+
+
+class UploadOffsetMismatch(UploadError):
+    """Raised when a chunk does not start at the current upload offset."""
+
+
+class UploadTooLarge(UploadError):
+    """
+    Raised when an upload is declared larger than `UPLOAD_MAX_SIZE`, or a chunk
+    would grow it past its declared length.
+    """
+
+
+class UploadIncomplete(UploadError):
+    """Raised when an upload is used or finalised before all bytes arrived."""
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    # Only hand out locks for existing uploads, so made-up IDs leave no entry
+    if not os.path.isdir(_upload_path(upload_id)):
+        raise UploadNotFound(f"Unknown upload ID: {upload_id}")
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _upload_path(upload_id: str) -> str:
+    # The ID ends up in a filesystem path, so only accept what we generate
+    if not isinstance(upload_id, str) or not _UPLOAD_ID_RE.match(upload_id):
+        raise UploadNotFound(f"Invalid upload ID: {upload_id!r}")
+    return os.path.join(UPLOAD_DIR, upload_id)
+
+
+def _read_meta(upload_id: str) -> dict:
+    meta_path = os.path.join(_upload_path(upload_id), 'meta.json')
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadNotFound(f"Unknown upload ID: {upload_id}") from None
+
+
+def _write_meta(upload_id: str, meta: dict) -> None:
+    upload_path = _upload_path(upload_id)
+    tmp_path = os.path.join(upload_path, 'meta.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(upload_path, 'meta.json'))
+
+
+def _current_offset(upload_id: str) -> int:
+    data_path = os.path.join(_upload_path(upload_id), 'data')
+    try:
+        return os.path.getsize(data_path)
+    except FileNotFoundError:
+        return 0
+
+
+def create_upload(filename: str, length: int) -> str:
+    """
+    Registers a new chunked upload and reserves a directory for its data.
+
+    Args:
+        filename (str): Original name of the file being uploaded.
+        length (int): Total size of the file in bytes.
+
+    Returns:
+        str: The ID used to send chunks to and later reference the upload.
+
+    Raises:
+        ValueError: If the declared length is negative.
+        UploadTooLarge: If the declared length exceeds `UPLOAD_MAX_SIZE`.
+    """
+    if length < 0:
+        raise ValueError("Upload length must not be negative.")
+    if length > UPLOAD_MAX_SIZE:
+        raise UploadTooLarge(
+            f"Upload of {length} bytes exceeds the maximum of {UPLOAD_MAX_SIZE} bytes")
+
+    purge_expired()
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_upload_path(upload_id))
+    open(os.path.join(_upload_path(upload_id), 'data'), 'wb').close()
+
+    _write_meta(upload_id, {
+        'filename': os.path.basename(filename) or 'file',
+        'length': length,
+        'complete': False,
+        'created': time.time(),
+    })
+    logger.debug(f"Created upload {upload_id} for {filename} ({length} bytes)")
+    return upload_id
+
+
+def get_upload(upload_id: str) -> dict:
+    """
+    Returns the metadata of an upload together with its current offset.
+
+    Args:
+        upload_id (str): ID returned by `create_upload`.
+
+    Returns:
+        dict: `filename`, `length`, `offset` and `complete` of the upload.
+
+    Raises:
+        UploadNotFound: If the upload does not exist.
+    """
+    meta = _read_meta(upload_id)
+    meta['offset'] = _current_offset(upload_id)
+    return meta
+
+
+def append_chunk(upload_id: str, offset: int, stream, chunk_length: int = None) -> int:
+    """
+    Appends a chunk read from `stream` to an upload.
+
+    The chunk must start exactly at the current offset, so a client that lost
+    its connection asks for the offset and re-sends only what is missing.
+
+    The upload lock is only held to check the offset and to write each
+    buffer, never while reading from the network. A request whose connection
+    stalled therefore cannot block the client's retry; once the retry has
+    moved the offset, the stalled request fails its next offset check.
+
+    Args:
+        upload_id (str): ID returned by `create_upload`.
+        offset (int): Byte offset the client claims the chunk starts at.
+        stream: A readable binary stream holding the chunk.
+        chunk_length (int): Optional size of the chunk, if known upfront.
+
+    Returns:
+        int: The new upload offset.
+
+    Raises:
+        UploadNotFound: If the upload does not exist.
+        UploadOffsetMismatch: If `offset` is not the current offset, or another
+            request moved the offset while this chunk was being received.
+        UploadTooLarge: If the chunk exceeds the declared upload length.
+    """
+    lock = _lock_for(upload_id)
+    with lock:
+        meta = _read_meta(upload_id)
+        current = _current_offset(upload_id)
+
+        if meta['complete']:
+            raise UploadOffsetMismatch(f"Upload {upload_id} is already finalised")
+        if offset != current:
+            raise UploadOffsetMismatch(
+                f"Chunk offset {offset} does not match upload offset {current}")
+
+    remaining = meta['length'] - current
+    if chunk_length is not None and chunk_length > remaining:
+        raise UploadTooLarge(
+            f"Chunk of {chunk_length} bytes exceeds remaining {remaining} bytes")
+
+    data_path = os.path.join(_upload_path(upload_id), 'data')
+    written = 0
+    while True:
+        # Read outside the lock, this may block on a slow or stalled client
+        buffer = stream.read(min(CHUNK_BUFFER_SIZE, remaining - written + 1))
+        if not buffer:
+            break
+
+        with lock:
+            if not os.path.isdir(_upload_path(upload_id)):
+                raise UploadNotFound(f"Upload {upload_id} was deleted")
+            if _read_meta(upload_id)['complete']:
+                raise UploadOffsetMismatch(f"Upload {upload_id} is already finalised")
+            position = _current_offset(upload_id)
+            if position != current + written:
+                raise UploadOffsetMismatch(
+                    f"Upload {upload_id} moved to offset {position} by another request")
+
+            with open(data_path, 'ab') as f:
+                if written + len(buffer) > remaining:
+                    # Drop the partial chunk, the client retries from `current`
+                    f.truncate(current)
+                    raise UploadTooLarge(
+                        f"Chunk exceeds remaining {remaining} bytes of upload {upload_id}")
+                f.write(buffer)
+            written += len(buffer)
+
+    logger.debug(f"Appended {written} bytes to upload {upload_id}")
+    return current + written
+
+
+def finalize_upload(upload_id: str) -> dict:
+    """
+    Marks an upload as complete once all declared bytes have been received.
+
+    Args:
+        upload_id (str): ID returned by `create_upload`.
+
+    Returns:
+        dict: The final upload metadata.
+
+    Raises:
+        UploadNotFound: If the upload does not exist.
+        UploadIncomplete: If bytes are still missing.
+    """
+    with _lock_for(upload_id):
+        meta = _read_meta(upload_id)
+        offset = _current_offset(upload_id)
+
+        if offset != meta['length']:
+            raise UploadIncomplete(
+                f"Upload {upload_id} has {offset}/{meta['length']} bytes")
+
+        meta['complete'] = True
+        _write_meta(upload_id, meta)
+
+    logger.debug(f"Finalised upload {upload_id}")
+    meta['offset'] = offset
+    return meta
+
+
+def open_upload(upload_id: str) -> FileStorage:
+    """
+    Opens a finalised upload so it can be passed to the `utils.pdf` operations
+    in place of a multipart file. The caller is responsible for closing it.
+
+    Args:
+        upload_id (str): ID returned by `create_upload`.
+
+    Returns:
+        FileStorage: The upload, carrying its original filename.
+
+    Raises:
+        UploadNotFound: If the upload does not exist.
+        UploadIncomplete: If the upload has not been finalised.
+    """
+    meta = _read_meta(upload_id)
+    if not meta['complete']:
+        raise UploadIncomplete(f"Upload {upload_id} has not been finalised")
+
+    stream = open(os.path.join(_upload_path(upload_id), 'data'), 'rb')
+    return FileStorage(stream=stream, filename=meta['filename'])
+
+
+def delete_upload(upload_id: str) -> None:
+    """
+    Removes an upload and its data from disk.
+
+    Raises:
+        UploadNotFound: If the upload does not exist.
+    """
+    upload_path = _upload_path(upload_id)
+    if not os.path.isdir(upload_path):
+        raise UploadNotFound(f"Unknown upload ID: {upload_id}")
+
+    with _lock_for(upload_id):
+        shutil.rmtree(upload_path, ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+    logger.debug(f"Deleted upload {upload_id}")
+
+
+def _last_activity(upload_id: str) -> float:
+    # Chunks touch `data` and finalising rewrites `meta.json`; an upload that
+    # never received a chunk has no `data` file yet
+    upload_path = _upload_path(upload_id)
+    times = [os.path.getmtime(upload_path)]
+    for name in ('data', 'meta.json'):
+        path = os.path.join(upload_path, name)
+        if os.path.exists(path):
+            times.append(os.path.getmtime(path))
+    return max(times)
+
+
+def purge_expired(ttl: int = UPLOAD_TTL) -> None:
+    """
+    Removes uploads without activity for `ttl` seconds, so a slow upload that
+    keeps sending chunks is never deleted mid-transfer, and the locks of
+    uploads that no longer exist.
+    """
+    with _locks_guard:
+        for upload_id in list(_locks):
+            if not os.path.isdir(os.path.join(UPLOAD_DIR, upload_id)):
+                del _locks[upload_id]
+
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+
+    cutoff = time.time() - ttl
+    for upload_id in os.listdir(UPLOAD_DIR):
+        try:
+            if _last_activity(upload_id) < cutoff:
+                delete_upload(upload_id)
+        except (UploadError, OSError):
+            continue